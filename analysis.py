@@ -1,13 +1,120 @@
 from flask import Blueprint, request, jsonify
-import openai
-import os
+import orjson
 from datetime import datetime
 import uuid
 
+import llm_cache
+import rate_limit
+from openai_client import client
+
 analysis_bp = Blueprint('analysis', __name__)
 
-# Initialize OpenAI client
-client = openai.OpenAI()
+# Inputs shorter than this (or with no letters at all) cannot contain
+# meaningful mistakes, so they skip the LLM entirely; inputs above the cap
+# are refused before they can tie up a worker on a token-runaway request
+MIN_TEXT_LENGTH = 20
+MAX_TEXT_LENGTH = 100_000
+
+# Prompt templates are built once at import; handlers fill in the language
+# and text with format_map instead of re-allocating the multi-line literals
+# on every request. JSON braces are doubled so format_map leaves them alone.
+_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are an expert language teacher and proofreader. Analyze text for mistakes and return results in the exact JSON format requested."
+}
+
+_GRAMMAR_TMPL = """
+Analyze the following text for GRAMMAR mistakes only. Ignore spelling errors.
+Language: {language}
+
+For each grammar mistake found:
+1. Identify the exact word or phrase with the mistake
+2. Explain what type of grammar error it is
+3. Provide the correct version
+4. Give the position (approximate line/sentence number)
+
+Text to analyze:
+{text}
+
+Return the response in JSON format with this structure:
+{{
+    "mistakes": [
+        {{
+            "type": "grammar",
+            "original": "incorrect text",
+            "corrected": "correct text",
+            "explanation": "explanation of the error",
+            "position": "line/sentence number"
+        }}
+    ],
+    "total_mistakes": number,
+    "analysis_type": "grammar_only"
+}}
+"""
+
+_SPELLING_TMPL = """
+Analyze the following text for SPELLING mistakes only. Ignore grammar errors.
+Language: {language}
+
+For each spelling mistake found:
+1. Identify the exact misspelled word
+2. Provide the correct spelling
+3. Give the position (approximate line/sentence number)
+
+Text to analyze:
+{text}
+
+Return the response in JSON format with this structure:
+{{
+    "mistakes": [
+        {{
+            "type": "spelling",
+            "original": "misspelled word",
+            "corrected": "correct spelling",
+            "explanation": "spelling correction",
+            "position": "line/sentence number"
+        }}
+    ],
+    "total_mistakes": number,
+    "analysis_type": "spelling_only"
+}}
+"""
+
+_BOTH_TMPL = """
+Analyze the following text for both GRAMMAR and SPELLING mistakes.
+Language: {language}
+
+For each mistake found:
+1. Identify the exact word or phrase with the mistake
+2. Specify if it's a grammar or spelling error
+3. Provide the correct version
+4. Explain the error
+5. Give the position (approximate line/sentence number)
+
+Text to analyze:
+{text}
+
+Return the response in JSON format with this structure:
+{{
+    "mistakes": [
+        {{
+            "type": "grammar" or "spelling",
+            "original": "incorrect text",
+            "corrected": "correct text",
+            "explanation": "explanation of the error",
+            "position": "line/sentence number"
+        }}
+    ],
+    "total_mistakes": number,
+    "analysis_type": "grammar_spelling"
+}}
+"""
+
+_TEMPLATES = {
+    'grammar_only': _GRAMMAR_TMPL,
+    'spelling_only': _SPELLING_TMPL,
+    'grammar_spelling': _BOTH_TMPL
+}
 
 @analysis_bp.route('/analyze', methods=['POST'])
 def analyze_document():
@@ -21,125 +128,91 @@ def analyze_document():
         text = data['text']
         analysis_type = data.get('analysis_type', 'grammar_spelling')
         language = data.get('language', 'english')
-        
-        # Create analysis prompt based on type
-        if analysis_type == 'grammar_only':
-            prompt = f"""
-            Analyze the following text for GRAMMAR mistakes only. Ignore spelling errors.
-            Language: {language}
-            
-            For each grammar mistake found:
-            1. Identify the exact word or phrase with the mistake
-            2. Explain what type of grammar error it is
-            3. Provide the correct version
-            4. Give the position (approximate line/sentence number)
-            
-            Text to analyze:
-            {text}
-            
-            Return the response in JSON format with this structure:
-            {{
-                "mistakes": [
-                    {{
-                        "type": "grammar",
-                        "original": "incorrect text",
-                        "corrected": "correct text",
-                        "explanation": "explanation of the error",
-                        "position": "line/sentence number"
-                    }}
-                ],
-                "total_mistakes": number,
-                "analysis_type": "grammar_only"
-            }}
-            """
-        elif analysis_type == 'spelling_only':
-            prompt = f"""
-            Analyze the following text for SPELLING mistakes only. Ignore grammar errors.
-            Language: {language}
-            
-            For each spelling mistake found:
-            1. Identify the exact misspelled word
-            2. Provide the correct spelling
-            3. Give the position (approximate line/sentence number)
-            
-            Text to analyze:
-            {text}
-            
-            Return the response in JSON format with this structure:
-            {{
-                "mistakes": [
-                    {{
-                        "type": "spelling",
-                        "original": "misspelled word",
-                        "corrected": "correct spelling",
-                        "explanation": "spelling correction",
-                        "position": "line/sentence number"
-                    }}
-                ],
-                "total_mistakes": number,
-                "analysis_type": "spelling_only"
-            }}
-            """
-        else:  # grammar_spelling (default)
-            prompt = f"""
-            Analyze the following text for both GRAMMAR and SPELLING mistakes.
-            Language: {language}
-            
-            For each mistake found:
-            1. Identify the exact word or phrase with the mistake
-            2. Specify if it's a grammar or spelling error
-            3. Provide the correct version
-            4. Explain the error
-            5. Give the position (approximate line/sentence number)
-            
-            Text to analyze:
-            {text}
-            
-            Return the response in JSON format with this structure:
-            {{
-                "mistakes": [
-                    {{
-                        "type": "grammar" or "spelling",
-                        "original": "incorrect text",
-                        "corrected": "correct text",
-                        "explanation": "explanation of the error",
-                        "position": "line/sentence number"
-                    }}
+
+        if len(text) > MAX_TEXT_LENGTH:
+            return jsonify({'error': f'Text too long; maximum is {MAX_TEXT_LENGTH} characters'}), 413
+
+        stripped = text.strip()
+        if len(stripped) < MIN_TEXT_LENGTH or not any(c.isalpha() for c in stripped):
+            return jsonify({
+                'mistakes': [],
+                'total_mistakes': 0,
+                'analysis_type': analysis_type,
+                'analysis_id': uuid.uuid4().hex,
+                'timestamp': datetime.utcnow().isoformat(),
+                'language': language,
+                'text_length': len(text)
+            })
+
+        # Identical texts always yield the same corrections, so serve repeats
+        # from the cache instead of paying OpenAI latency and token cost again
+        cache_key = llm_cache.make_cache_key('gpt-3.5-turbo', analysis_type, language, text)
+        cached = llm_cache.get_cached_result(cache_key)
+        if cached is not None:
+            result = dict(cached)
+            result['analysis_id'] = uuid.uuid4().hex
+            result['timestamp'] = datetime.utcnow().isoformat()
+            result['language'] = language
+            result['text_length'] = len(text)
+            return jsonify(result)
+
+        # Exact match missed; check whether a near-duplicate text (same content
+        # modulo whitespace or a word or two) was already analyzed
+        embedding = None
+        try:
+            embedding_response = client.embeddings.create(
+                model=llm_cache.EMBEDDING_MODEL,
+                input=llm_cache.normalize_text(text)
+            )
+            embedding = embedding_response.data[0].embedding
+            semantic_hit = llm_cache.get_semantic_result(embedding, analysis_type, language)
+            if semantic_hit is not None:
+                result = dict(semantic_hit)
+                result['analysis_id'] = uuid.uuid4().hex
+                result['timestamp'] = datetime.utcnow().isoformat()
+                result['language'] = language
+                result['text_length'] = len(text)
+                return jsonify(result)
+        except Exception:
+            # The semantic cache is best-effort; fall through to a full analysis
+            embedding = None
+
+        # Fill the precompiled prompt template for this analysis type
+        prompt = _TEMPLATES.get(analysis_type, _BOTH_TMPL).format_map(
+            {'language': language, 'text': text}
+        )
+
+        # Call OpenAI API, throttled against our RPM/TPM budget. JSON mode
+        # guarantees a parseable object, and streaming lets us consume the
+        # multi-second response as it arrives instead of buffering it in the
+        # SDK first.
+        stream = rate_limit.throttled(
+            lambda: client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    _SYSTEM_MESSAGE,
+                    {"role": "user", "content": prompt}
                 ],
-                "total_mistakes": number,
-                "analysis_type": "grammar_spelling"
-            }}
-            """
-        
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert language teacher and proofreader. Analyze text for mistakes and return results in the exact JSON format requested."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
+                temperature=0,  # deterministic output keeps the cache effective
+                response_format={"type": "json_object"},
+                stream=True
+            ),
+            rate_limit.estimate_tokens(text)
         )
-        
-        # Parse the response
-        analysis_result = response.choices[0].message.content
-        
-        # Try to parse as JSON
-        try:
-            import json
-            result = json.loads(analysis_result)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, create a basic response
-            result = {
-                "mistakes": [],
-                "total_mistakes": 0,
-                "analysis_type": analysis_type,
-                "raw_response": analysis_result
-            }
+
+        buffer = bytearray()
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                buffer += chunk.choices[0].delta.content.encode('utf-8')
+
+        result = orjson.loads(bytes(buffer))
+        llm_cache.set_cached_result(cache_key, result)
+        if embedding is not None:
+            llm_cache.add_semantic_result(embedding, result, analysis_type, language)
         
         # Add metadata
-        result['analysis_id'] = str(uuid.uuid4())
-        result['timestamp'] = datetime.now().isoformat()
+        result['analysis_id'] = uuid.uuid4().hex
+        result['timestamp'] = datetime.utcnow().isoformat()
         result['language'] = language
         result['text_length'] = len(text)
         
@@ -148,6 +221,95 @@ def analyze_document():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@analysis_bp.route('/analyze_batch', methods=['POST'])
+def analyze_batch():
+    """Analyze multiple texts in a single OpenAI request"""
+    try:
+        data = request.get_json()
+
+        if not data or 'texts' not in data:
+            return jsonify({'error': 'No texts provided'}), 400
+
+        texts = data['texts']
+        language = data.get('language', 'english')
+
+        if not isinstance(texts, list) or not texts:
+            return jsonify({'error': 'texts must be a non-empty list'}), 400
+
+        # One numbered prompt for all texts amortizes the per-request latency
+        # and the requests-per-minute limit, which is the binding constraint
+        # for short documents
+        numbered = '\n\n'.join(f'[{i + 1}]\n{text}' for i, text in enumerate(texts))
+        prompt = f"""
+        Analyze each of the following {len(texts)} texts for both GRAMMAR and SPELLING mistakes.
+        Language: {language}
+
+        The texts are numbered [1] to [{len(texts)}]. For each text, find every mistake,
+        provide the correction, an explanation, and the approximate position.
+
+        Texts to analyze:
+        {numbered}
+
+        Return the response in JSON format with this structure:
+        {{
+            "results": [
+                {{
+                    "text_number": 1,
+                    "mistakes": [
+                        {{
+                            "type": "grammar" or "spelling",
+                            "original": "incorrect text",
+                            "corrected": "correct text",
+                            "explanation": "explanation of the error",
+                            "position": "line/sentence number"
+                        }}
+                    ],
+                    "total_mistakes": number
+                }}
+            ]
+        }}
+        Include one entry in "results" for every text, in order.
+        """
+
+        response = rate_limit.throttled(
+            lambda: client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    _SYSTEM_MESSAGE,
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0,
+                response_format={"type": "json_object"}
+            ),
+            rate_limit.estimate_tokens(numbered)
+        )
+
+        analysis_result = response.choices[0].message.content
+
+        try:
+            parsed = orjson.loads(analysis_result)
+            batch_results = parsed.get('results', [])
+        except orjson.JSONDecodeError:
+            return jsonify({'error': 'Failed to parse analysis response', 'raw_response': analysis_result}), 502
+
+        # Split by index and attach per-item metadata
+        results = []
+        for i, text in enumerate(texts):
+            item = batch_results[i] if i < len(batch_results) else {'mistakes': [], 'total_mistakes': 0}
+            item['analysis_id'] = uuid.uuid4().hex
+            item['language'] = language
+            item['text_length'] = len(text)
+            results.append(item)
+
+        return jsonify({
+            'results': results,
+            'total_texts': len(texts),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @analysis_bp.route('/upload', methods=['POST'])
 def upload_document():
     """Handle document upload and extract text"""
@@ -159,18 +321,14 @@ def upload_document():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Save uploaded file temporarily
-        filename = f"{uuid.uuid4()}_{file.filename}"
-        filepath = os.path.join('/tmp', filename)
-        file.save(filepath)
-        
-        # Extract text based on file type
+        # Extract text straight from the upload stream; writing to /tmp and
+        # reading it back doubled the bytes moved for no benefit
         text = ""
         file_extension = file.filename.lower().split('.')[-1]
-        
+
         if file_extension == 'txt':
-            with open(filepath, 'r', encoding='utf-8') as f:
-                text = f.read()
+            raw = file.stream.read()
+            text = raw.decode('utf-8', errors='replace')
         elif file_extension == 'pdf':
             # For PDF files, we'll use a simple approach
             # In production, you'd use libraries like PyPDF2 or pdfplumber
@@ -180,10 +338,7 @@ def upload_document():
             text = "Word document text extraction would be implemented here. For demo purposes, please use text files."
         else:
             return jsonify({'error': 'Unsupported file type. Please use .txt, .pdf, or .docx files'}), 400
-        
-        # Clean up temporary file
-        os.remove(filepath)
-        
+
         return jsonify({
             'filename': file.filename,
             'text': text,
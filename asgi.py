@@ -0,0 +1,23 @@
+from a2wsgi import WSGIMiddleware
+from uvicorn.workers import UvicornWorker
+
+from main import app
+
+# ASGI entrypoint: run with `gunicorn -c gunicorn.conf.py` (or
+# `uvicorn asgi:asgi_app`). a2wsgi dispatches each request onto its own
+# thread pool, so one worker process overlaps many in-flight OpenAI/Stripe
+# round-trips; asgiref's WsgiToAsgi funnels every request through a single
+# thread_sensitive executor and would serialize them.
+asgi_app = WSGIMiddleware(app, workers=64)
+
+
+class TunedUvicornWorker(UvicornWorker):
+    """Uvicorn worker pinned to uvloop and the httptools HTTP parser.
+
+    The endpoints receive many small POSTs (webhooks especially), where the
+    ceiling is socket accept/read/write work, not handler CPU. uvloop's
+    libuv-based loop batches that work far more efficiently than the stdlib
+    selector loop, and httptools replaces the pure-Python h11 parser.
+    """
+
+    CONFIG_KWARGS = {'loop': 'uvloop', 'http': 'httptools'}
@@ -0,0 +1,10 @@
+import multiprocessing
+
+# The workload is network-bound (OpenAI / Stripe round-trips); a2wsgi (see
+# asgi.py) dispatches requests onto a thread pool, so each worker process
+# overlaps many in-flight calls instead of blocking on one at a time.
+bind = '0.0.0.0:5000'
+workers = multiprocessing.cpu_count()
+worker_class = 'asgi.TunedUvicornWorker'
+worker_connections = 1000
+wsgi_app = 'asgi:asgi_app'
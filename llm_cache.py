@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Optional Redis backend; falls back to an in-process cache for development
+try:
+    import redis as _redis_lib
+except ImportError:
+    _redis_lib = None
+
+CACHE_TTL_SECONDS = 86400  # 24 hours
+
+EMBEDDING_MODEL = 'text-embedding-3-small'
+SEMANTIC_SIMILARITY_THRESHOLD = 0.97
+
+
+class TTLCache:
+    """Simple thread-safe in-process cache with per-entry expiry"""
+
+    def __init__(self, max_entries=10000):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=CACHE_TTL_SECONDS):
+        with self._lock:
+            if len(self._entries) >= self._max_entries:
+                # Drop the oldest-expiring entries to make room
+                for stale_key, _ in sorted(self._entries.items(), key=lambda item: item[1][1])[:self._max_entries // 10]:
+                    del self._entries[stale_key]
+            self._entries[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def set_if_absent(self, key, value, ttl=CACHE_TTL_SECONDS):
+        """Store the entry only if absent; True if this call stored it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= time.monotonic():
+                return False
+            self._entries[key] = (value, time.monotonic() + ttl)
+            return True
+
+
+def _connect_redis():
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url and _redis_lib is not None:
+        return _redis_lib.Redis.from_url(redis_url)
+    return None
+
+
+_redis = _connect_redis()
+_local_cache = TTLCache()
+
+
+def make_cache_key(model, analysis_type, language, text):
+    """Build a deterministic cache key for an analysis request"""
+    payload = json.dumps(
+        {'model': model, 'type': analysis_type, 'lang': language, 'text': text},
+        sort_keys=True
+    )
+    return 'llm:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_cached_result(cache_key):
+    """Return the cached analysis result dict, or None on a miss"""
+    if _redis is not None:
+        cached = _redis.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+        return None
+    return _local_cache.get(cache_key)
+
+
+def set_cached_result(cache_key, result, ttl=CACHE_TTL_SECONDS):
+    """Store an analysis result dict under the given key"""
+    if _redis is not None:
+        _redis.setex(cache_key, ttl, json.dumps(result))
+    else:
+        _local_cache.set(cache_key, result, ttl)
+
+
+def delete_cached_result(cache_key):
+    """Drop a cached value so the next read goes to the source"""
+    if _redis is not None:
+        _redis.delete(cache_key)
+    else:
+        _local_cache.delete(cache_key)
+
+
+def set_if_absent(cache_key, ttl=CACHE_TTL_SECONDS):
+    """Atomically record a key; True only for the first caller.
+
+    Backed by SET NX EX on Redis, so markers (e.g. processed webhook event
+    ids) are shared across worker processes.
+    """
+    if _redis is not None:
+        return bool(_redis.set(cache_key, 1, nx=True, ex=ttl))
+    return _local_cache.set_if_absent(cache_key, True, ttl)
+
+
+# Semantic cache: catches inputs that differ only by whitespace or a word or
+# two, which the exact-match cache above misses. Embeddings are ~100x cheaper
+# than chat completions, so even modest hit rates pay for the extra call.
+# Entries are partitioned by (analysis_type, language), mirroring the exact
+# cache key: a near-identical text must never be answered with a different
+# analysis type's (or language's) result.
+_semantic_lock = threading.Lock()
+_semantic_partitions = {}  # (analysis_type, language) -> (vectors, results)
+_SEMANTIC_MAX_ENTRIES = 10000  # per partition
+
+
+def normalize_text(text):
+    """Collapse whitespace and case so near-identical texts embed alike"""
+    return ' '.join(text.lower().split())
+
+
+def _unit_vector(embedding):
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec = vec / norm
+    return vec
+
+
+def get_semantic_result(embedding, analysis_type, language):
+    """Return the cached result for the closest prior text of the same
+    analysis type and language, or None"""
+    vec = _unit_vector(embedding)
+    with _semantic_lock:
+        partition = _semantic_partitions.get((analysis_type, language))
+        if partition is None or not partition[0]:
+            return None
+        vectors, results = partition
+        scores = np.vstack(vectors) @ vec
+        best = int(np.argmax(scores))
+        if scores[best] > SEMANTIC_SIMILARITY_THRESHOLD:
+            return results[best]
+    return None
+
+
+def add_semantic_result(embedding, result, analysis_type, language):
+    """Insert an embedding/result pair into the semantic cache"""
+    vec = _unit_vector(embedding)
+    with _semantic_lock:
+        vectors, results = _semantic_partitions.setdefault(
+            (analysis_type, language), ([], [])
+        )
+        if len(vectors) >= _SEMANTIC_MAX_ENTRIES:
+            del vectors[0]
+            del results[0]
+        vectors.append(vec)
+        results.append(result)
@@ -4,7 +4,9 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from flask import Flask, send_from_directory
+from flask_compress import Compress
 from flask_cors import CORS
+from src.json_provider import OrjsonProvider
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.analysis import analysis_bp
@@ -12,6 +14,17 @@ from src.routes.subscription import subscription_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+# Uploads are held in memory now, so cap the request body size
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+
+# Serialize all jsonify responses with orjson
+app.json = OrjsonProvider(app)
+
+# Compress large JSON responses (MCQ batch results compress 5-15x)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_LEVEL'] = 4
+Compress(app)
 
 # Enable CORS for all routes
 CORS(app)
@@ -1,14 +1,23 @@
 from flask import Blueprint, request, jsonify
-import openai
-import os
 from datetime import datetime
 import uuid
-import json
+
+import numpy as np
+
+import llm_cache
 
 mcq_bp = Blueprint('mcq_analysis', __name__)
 
-# Initialize OpenAI client
-client = openai.OpenAI()
+# Processed answer keys, stored by answer_key_id at upload time so repeat
+# batches of the same exam skip re-sending and re-normalizing the key.
+# Stored through llm_cache so that with REDIS_URL set the key is visible to
+# every gunicorn worker, not just the one the upload landed on; only the
+# JSON-serializable processed key goes in, and the NumPy encoding is rebuilt
+# per batch on fetch.
+ANSWER_KEY_TTL_SECONDS = 86400
+
+def _answer_key_cache_key(answer_key_id):
+    return 'mcq:key:' + answer_key_id
 
 @mcq_bp.route('/upload-answer-key', methods=['POST'])
 def upload_answer_key():
@@ -46,17 +55,21 @@ def upload_answer_key():
                 })
         
         # Generate unique answer key ID
-        answer_key_id = str(uuid.uuid4())
-        
-        # In a real application, you would save this to a database
-        # For now, we'll return the processed key with an ID
-        
+        answer_key_id = uuid.uuid4().hex
+
+        # Store the processed key so analyze-mcq-batch can score against it
+        # without the caller re-sending it
+        llm_cache.set_cached_result(
+            _answer_key_cache_key(answer_key_id), processed_key,
+            ttl=ANSWER_KEY_TTL_SECONDS
+        )
+
         return jsonify({
             'answer_key_id': answer_key_id,
             'subject': subject,
             'total_questions': len(processed_key),
             'processed_key': processed_key,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': datetime.utcnow().isoformat(),
             'message': 'Answer key uploaded successfully'
         })
         
@@ -74,11 +87,18 @@ def analyze_mcq_batch():
         
         answer_key_id = data['answer_key_id']
         student_answers = data['student_answers']  # List of student answer sheets
-        answer_key = data.get('answer_key', [])  # The correct answers
-        
+
+        # Prefer the key stored at upload time; the inline answer_key payload
+        # is only a fallback for callers that never uploaded one
+        stored_key = llm_cache.get_cached_result(_answer_key_cache_key(answer_key_id))
+        if stored_key is not None:
+            answer_key = stored_key
+        else:
+            answer_key = data.get('answer_key', [])  # The correct answers
+
         if not answer_key:
             return jsonify({'error': 'Answer key is required'}), 400
-        
+
         if not isinstance(student_answers, list):
             return jsonify({'error': 'Student answers must be a list'}), 400
         
@@ -91,34 +111,79 @@ def analyze_mcq_batch():
                 'error': f'Your {user_plan} plan allows maximum {max_analyses} MCQ analyses. You submitted {len(student_answers)}.'
             }), 400
         
+        # Explanations are shown on-demand via /mcq-report, so skip building
+        # them unless the client explicitly asks
+        include_explanations = bool(data.get('include_explanations', False))
+
+        # Build the encoding once for the whole batch; a fresh vocab per
+        # batch keeps the stored key immutable
+        key_strings = _normalize_key(answer_key)
+        vocab = {}
+        key_codes = _encode_answers(key_strings, vocab)
+
+        # Encode every sheet, then score the whole batch as one
+        # students x questions matrix comparison instead of a Python loop
+        # over sheets
+        total_questions = len(answer_key)
         results = []
-        
+        rows = []         # encoded answers for successfully parsed sheets
+        row_sheets = []   # their string answers, for mistake detail
+        row_indices = []  # position of each row's result in `results`
+
         for idx, student_sheet in enumerate(student_answers):
             try:
-                # Analyze individual student sheet
-                analysis_result = analyze_single_mcq_sheet(
-                    student_sheet, 
-                    answer_key, 
-                    idx + 1
-                )
-                results.append(analysis_result)
-                
+                sheet = _sheet_answers(student_sheet, total_questions)
+                rows.append(_encode_answers(sheet, vocab))
+                row_sheets.append(sheet)
+                row_indices.append(idx)
+                results.append(None)  # filled in from the matrix below
             except Exception as e:
                 results.append({
                     'student_id': idx + 1,
                     'error': f'Failed to analyze sheet {idx + 1}: {str(e)}',
                     'score': 0,
-                    'total_questions': len(answer_key)
+                    'total_questions': total_questions
                 })
+
+        if rows:
+            student_matrix = np.vstack(rows)
+            correct_matrix = (student_matrix == key_codes[None, :]) & (student_matrix != 0)
+            correct_counts = correct_matrix.sum(axis=1)
+            unanswered_counts = (student_matrix == 0).sum(axis=1)
+            if total_questions > 0:
+                percentages = 100.0 * correct_counts / total_questions
+            else:
+                percentages = np.zeros(len(rows))
+            grades = calculate_grades(percentages)
+
+            for row, idx in enumerate(row_indices):
+                correct_answers = int(correct_counts[row])
+                unanswered = int(unanswered_counts[row])
+                mask = correct_matrix[row]
+                results[idx] = {
+                    'student_id': idx + 1,
+                    'score': correct_answers,
+                    'total_questions': total_questions,
+                    'score_percentage': round(float(percentages[row]), 2),
+                    'correct_answers': correct_answers,
+                    'wrong_answers': total_questions - correct_answers - unanswered,
+                    'unanswered': unanswered,
+                    'mistakes': _build_mistakes(
+                        student_matrix[row], row_sheets[row], mask,
+                        key_strings, include_explanations
+                    ),
+                    'grade': str(grades[row]),
+                    '_correct_mask': mask
+                }
         
         # Generate summary statistics
         summary = generate_batch_summary(results, answer_key)
         
         return jsonify({
-            'analysis_id': str(uuid.uuid4()),
+            'analysis_id': uuid.uuid4().hex,
             'answer_key_id': answer_key_id,
             'total_sheets_analyzed': len(results),
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': datetime.utcnow().isoformat(),
             'summary': summary,
             'individual_results': results
         })
@@ -126,40 +191,88 @@ def analyze_mcq_batch():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def analyze_single_mcq_sheet(student_answers, answer_key, student_id):
-    """Analyze a single student's MCQ answer sheet"""
-    correct_answers = 0
-    wrong_answers = 0
-    unanswered = 0
+def _normalize_key(answer_key):
+    """Uppercase string form of each correct answer in the key"""
+    normalized = []
+    for answer in answer_key:
+        if isinstance(answer, dict):
+            answer = answer.get('correct_answer', '')
+        normalized.append(str(answer).upper())
+    return normalized
+
+def _sheet_answers(student_answers, total_questions):
+    """Uppercase string form of one sheet's answers, '' for unanswered"""
+    if isinstance(student_answers, dict):
+        return [str(student_answers.get(str(i + 1), '')).upper() for i in range(total_questions)]
+    return [
+        str(student_answers[i]).upper() if i < len(student_answers) else ''
+        for i in range(total_questions)
+    ]
+
+def _encode_answers(answers, vocab):
+    """Map answer strings onto small integer codes; '' (blank) stays 0"""
+    # int32 rather than uint8: the vocab grows with every distinct student
+    # answer string, and garbage answers must stay comparable, not overflow
+    codes = np.zeros(len(answers), dtype=np.int32)
+    for i, answer in enumerate(answers):
+        if answer:
+            codes[i] = vocab.setdefault(answer, len(vocab) + 1)
+    return codes
+
+def _build_mistakes(student_codes, sheet, correct_mask, key_strings, include_explanations):
+    """Materialize mistake dicts for the wrong/unanswered questions only"""
     mistakes = []
-    
-    for i, correct_answer in enumerate(answer_key):
-        question_num = i + 1
-        student_answer = student_answers.get(str(question_num), '').upper() if isinstance(student_answers, dict) else (student_answers[i].upper() if i < len(student_answers) else '')
-        correct = correct_answer.get('correct_answer', correct_answer).upper() if isinstance(correct_answer, dict) else str(correct_answer).upper()
-        
-        if not student_answer or student_answer == '':
-            unanswered += 1
-            mistakes.append({
+    for i in np.flatnonzero(~correct_mask):
+        question_num = int(i) + 1
+        if student_codes[i] == 0:
+            mistake = {
                 'question_number': question_num,
                 'type': 'unanswered',
                 'student_answer': '',
-                'correct_answer': correct,
-                'explanation': f'Question {question_num} was not answered'
-            })
-        elif student_answer == correct:
-            correct_answers += 1
+                'correct_answer': key_strings[i]
+            }
+            if include_explanations:
+                mistake['explanation'] = f'Question {question_num} was not answered'
         else:
-            wrong_answers += 1
-            mistakes.append({
+            mistake = {
                 'question_number': question_num,
                 'type': 'incorrect',
-                'student_answer': student_answer,
-                'correct_answer': correct,
-                'explanation': f'Question {question_num}: Selected {student_answer}, correct answer is {correct}'
-            })
-    
+                'student_answer': sheet[i],
+                'correct_answer': key_strings[i]
+            }
+            if include_explanations:
+                mistake['explanation'] = f'Question {question_num}: Selected {sheet[i]}, correct answer is {key_strings[i]}'
+        mistakes.append(mistake)
+    return mistakes
+
+def analyze_single_mcq_sheet(student_answers, answer_key, student_id,
+                             key_strings=None, key_codes=None, vocab=None,
+                             include_explanations=False):
+    """Analyze a single student's MCQ answer sheet.
+
+    Scoring compares integer code arrays in NumPy rather than looping over
+    questions in Python; batch callers pass the pre-encoded key so it is
+    normalized once per batch instead of once per sheet.
+    """
     total_questions = len(answer_key)
+
+    if key_strings is None:
+        key_strings = _normalize_key(answer_key)
+    if vocab is None:
+        vocab = {}
+    if key_codes is None:
+        key_codes = _encode_answers(key_strings, vocab)
+
+    sheet = _sheet_answers(student_answers, total_questions)
+    student_codes = _encode_answers(sheet, vocab)
+
+    correct_mask = (student_codes == key_codes) & (student_codes != 0)
+    correct_answers = int(correct_mask.sum())
+    unanswered = int((student_codes == 0).sum())
+    wrong_answers = total_questions - correct_answers - unanswered
+
+    mistakes = _build_mistakes(student_codes, sheet, correct_mask,
+                               key_strings, include_explanations)
     score_percentage = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
     
     return {
@@ -171,7 +284,10 @@ def analyze_single_mcq_sheet(student_answers, answer_key, student_id):
         'wrong_answers': wrong_answers,
         'unanswered': unanswered,
         'mistakes': mistakes,
-        'grade': calculate_grade(score_percentage)
+        'grade': calculate_grade(score_percentage),
+        # Per-question correctness for the batch summary; stripped before
+        # the result is returned to the client
+        '_correct_mask': correct_mask
     }
 
 def generate_batch_summary(results, answer_key):
@@ -182,72 +298,66 @@ def generate_batch_summary(results, answer_key):
     total_students = len(results)
     total_questions = len(answer_key)
     
-    # Calculate averages
-    total_score = sum(result.get('score', 0) for result in results)
-    average_score = total_score / total_students if total_students > 0 else 0
+    # One pass over a scores array covers the mean/max/min below
+    scores = np.array([result.get('score', 0) for result in results])
+    average_score = float(scores.mean()) if total_students > 0 else 0
     average_percentage = (average_score / total_questions) * 100 if total_questions > 0 else 0
     
-    # Grade distribution
-    grade_distribution = {}
-    for result in results:
-        grade = result.get('grade', 'F')
-        grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
+    # Grade distribution in one pass over a grades array
+    grade_values, grade_counts = np.unique(
+        np.array([result.get('grade', 'F') for result in results]),
+        return_counts=True
+    )
+    grade_distribution = dict(zip(grade_values.tolist(), grade_counts.tolist()))
     
-    # Question-wise analysis
-    question_analysis = []
-    for i in range(total_questions):
-        question_num = i + 1
-        correct_count = 0
-        
-        for result in results:
-            if result.get('score', 0) > i:  # Simplified check
-                correct_count += 1
-        
-        difficulty = 'Easy' if correct_count / total_students > 0.8 else 'Medium' if correct_count / total_students > 0.5 else 'Hard'
-        
-        question_analysis.append({
-            'question_number': question_num,
-            'correct_responses': correct_count,
-            'incorrect_responses': total_students - correct_count,
-            'success_rate': round((correct_count / total_students) * 100, 2),
-            'difficulty': difficulty
-        })
+    # Question-wise analysis from the stacked correctness matrix
+    # (students x questions); one vectorized pass over actual per-question
+    # correctness, not the old score-vs-index comparison
+    masks = [result.pop('_correct_mask', None) for result in results]
+    correctness = np.vstack([
+        mask if mask is not None else np.zeros(total_questions, dtype=bool)
+        for mask in masks
+    ])
+    correct_per_question = correctness.sum(axis=0)
+    success_rates = correct_per_question / total_students
+    difficulties = np.where(
+        success_rates > 0.8, 'Easy',
+        np.where(success_rates > 0.5, 'Medium', 'Hard')
+    )
+
+    question_analysis = [
+        {
+            'question_number': i + 1,
+            'correct_responses': int(correct_per_question[i]),
+            'incorrect_responses': total_students - int(correct_per_question[i]),
+            'success_rate': round(float(success_rates[i]) * 100, 2),
+            'difficulty': str(difficulties[i])
+        }
+        for i in range(total_questions)
+    ]
     
     return {
         'total_students': total_students,
         'total_questions': total_questions,
         'average_score': round(average_score, 2),
         'average_percentage': round(average_percentage, 2),
-        'highest_score': max(result.get('score', 0) for result in results),
-        'lowest_score': min(result.get('score', 0) for result in results),
+        'highest_score': int(scores.max()),
+        'lowest_score': int(scores.min()),
         'grade_distribution': grade_distribution,
         'question_analysis': question_analysis
     }
 
+# Grade buckets, sorted by threshold so searchsorted can find the bucket
+_GRADE_THRESHOLDS = np.array([0, 45, 50, 55, 60, 65, 70, 75, 80, 85, 90])
+_GRADES = np.array(['F', 'D', 'C-', 'C', 'C+', 'B-', 'B', 'B+', 'A-', 'A', 'A+'])
+
 def calculate_grade(percentage):
     """Calculate letter grade based on percentage"""
-    if percentage >= 90:
-        return 'A+'
-    elif percentage >= 85:
-        return 'A'
-    elif percentage >= 80:
-        return 'A-'
-    elif percentage >= 75:
-        return 'B+'
-    elif percentage >= 70:
-        return 'B'
-    elif percentage >= 65:
-        return 'B-'
-    elif percentage >= 60:
-        return 'C+'
-    elif percentage >= 55:
-        return 'C'
-    elif percentage >= 50:
-        return 'C-'
-    elif percentage >= 45:
-        return 'D'
-    else:
-        return 'F'
+    return str(_GRADES[np.searchsorted(_GRADE_THRESHOLDS, percentage, side='right') - 1])
+
+def calculate_grades(percentages):
+    """Vectorized grade lookup for a whole batch of percentages at once"""
+    return _GRADES[np.searchsorted(_GRADE_THRESHOLDS, percentages, side='right') - 1]
 
 def get_mcq_limit(plan):
     """Get MCQ analysis limit based on subscription plan"""
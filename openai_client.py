@@ -0,0 +1,18 @@
+import httpx
+import openai
+
+# Single OpenAI client shared by every blueprint. The sync client is the one
+# that actually pools here: request concurrency comes from the WSGI thread
+# pool (see asgi.py), and a shared httpx.Client reuses warm connections
+# across those threads, whereas an AsyncClient is bound to one event loop
+# and Flask async views each run on their own short-lived loop. The explicit
+# pool is sized for batch load so concurrent requests skip the TLS
+# handshake, and HTTP/2 multiplexes in-flight requests over fewer TCP
+# connections.
+client = openai.OpenAI(
+    http_client=httpx.Client(
+        limits=httpx.Limits(max_connections=500, max_keepalive_connections=200),
+        timeout=httpx.Timeout(60, connect=5),
+        http2=True
+    )
+)
@@ -1,14 +1,142 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
+import asyncio
+import hashlib
+import hmac
+import logging
+import logging.handlers
+import msgspec
+import orjson
+import queue
+import random
+import requests
 import stripe
+import stripe.http_client
+import threading
+import time
 import os
-from datetime import datetime
-import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import MappingProxyType
+
+import llm_cache
+from llm_cache import TTLCache
 
 payment_bp = Blueprint('payment', __name__)
 
+# Log records pass through an unbounded queue and are written by a daemon
+# listener thread, so webhook handlers never block on a backpressured
+# stdout under event bursts
+_log_queue = queue.Queue(-1)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+
+# Subscription status rarely changes between frontend polls; cache the
+# fields we return for a few minutes, invalidated on cancellation and on
+# the payment/deletion webhooks. Stored through the shared llm_cache
+# backend so that with REDIS_URL set every gunicorn worker sees the same
+# entries and a webhook invalidation reaches them all, not just the worker
+# the delivery landed on.
+SUBSCRIPTION_TTL_SECONDS = 300
+
+def _subscription_cache_key(subscription_id):
+    return 'stripe:sub:' + subscription_id
+
+# Stripe calls block for the full API round-trip, so async views hand them
+# to a dedicated bounded pool instead of pinning a worker; the cap also
+# stops webhook bursts from starving checkout flows
+_stripe_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='stripe')
+
+class StripeBucket:
+    """Token bucket keeping outbound Stripe calls under the account limit.
+
+    Sized below Stripe's documented 100 req/s live-mode limit so a burst of
+    simultaneous checkouts queues briefly here instead of surfacing 429s to
+    users and risking account-wide throttling.
+    """
+
+    def __init__(self, capacity=90, refill_rate=90.0):
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.refill_rate = float(refill_rate)  # tokens per second
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.refill_rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
+_stripe_bucket = StripeBucket()
+STRIPE_MAX_RETRIES = 3
+
+def _call_with_throttle(func, *args, **kwargs):
+    """Gate a Stripe call on the bucket, retrying 429s with jittered backoff"""
+    for attempt in range(STRIPE_MAX_RETRIES + 1):
+        _stripe_bucket.acquire()
+        try:
+            return func(*args, **kwargs)
+        except stripe.error.RateLimitError:
+            if attempt == STRIPE_MAX_RETRIES:
+                raise
+            time.sleep(min(2 ** attempt, 8) + random.random() * 0.5)
+
+async def _run_stripe(func, *args, **kwargs):
+    """Run a blocking Stripe SDK call on the dedicated executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _stripe_executor, partial(_call_with_throttle, func, *args, **kwargs)
+    )
+
+# Customer ids resolved (or created) per email. Misses are deliberately not
+# cached: a miss means create_subscription is about to create the customer,
+# and the mapping is seeded right after so repeat checkouts for that email
+# reuse it instead of paying Customer.list or minting a duplicate.
+CUSTOMER_ID_TTL_SECONDS = 86400
+_customer_id_cache = TTLCache(max_entries=10000)
+
+def _customer_id_for_email(email):
+    """Return the existing Stripe customer id for an email, or None"""
+    customer_id = _customer_id_cache.get(email)
+    if customer_id is not None:
+        return customer_id
+    customers = stripe.Customer.list(email=email, limit=1)
+    if customers.data:
+        customer_id = customers.data[0].id
+        _customer_id_cache.set(email, customer_id, ttl=CUSTOMER_ID_TTL_SECONDS)
+        return customer_id
+    return None
+
 # Set your Stripe secret key (you'll need to replace this with your actual key)
 stripe.api_key = os.getenv('STRIPE_SECRET_KEY', 'sk_test_YOUR_SECRET_KEY_HERE')
 
+# stripe-python's default session keeps only a handful of pooled connections;
+# under concurrent checkout load that means a fresh TCP+TLS handshake to
+# api.stripe.com per call. Mount a larger pool sized to the executor and
+# token bucket above so warm connections get reused.
+_stripe_session = requests.Session()
+_stripe_session.mount('https://', requests.adapters.HTTPAdapter(
+    pool_connections=100, pool_maxsize=100, max_retries=0
+))
+stripe.default_http_client = stripe.http_client.RequestsClient(session=_stripe_session)
+
+# Environment doesn't change at runtime; read the webhook secret once
+# instead of on every webhook delivery
+_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', 'whsec_YOUR_WEBHOOK_SECRET')
+
 # Stripe Price IDs for each plan (you'll need to create these in Stripe Dashboard)
 STRIPE_PRICE_IDS = {
     'basic': 'price_YOUR_BASIC_PRICE_ID',
@@ -16,8 +144,51 @@ STRIPE_PRICE_IDS = {
     'premium': 'price_YOUR_PREMIUM_PRICE_ID'
 }
 
+# Subscription response shapes as msgspec Structs: the encoder for each is
+# generated once at class definition, so serializing skips both the
+# intermediate dict build and generic encoding. omit_defaults keeps
+# branch-specific fields (plan, client_secret) out of the other branch's
+# payload.
+class SubscriptionCreated(msgspec.Struct, omit_defaults=True):
+    subscription_id: str
+    customer_id: str
+    status: str
+    message: str
+    plan: str | None = None
+    client_secret: str | None = None
+
+class SubscriptionCancelled(msgspec.Struct):
+    subscription_id: str
+    status: str
+    cancel_at_period_end: bool
+    current_period_end: int
+    message: str
+
+class SubscriptionStatus(msgspec.Struct):
+    subscription_id: str
+    status: str
+    current_period_start: int
+    current_period_end: int
+    cancel_at_period_end: bool
+    plan: str | None
+
+def _struct_response(struct):
+    """Encode a msgspec Struct straight into a JSON response"""
+    return Response(msgspec.json.encode(struct), mimetype='application/json')
+
+# The static-message error branches are the hot ones when Stripe is degraded
+# (rate limited / unreachable), so their bodies are serialized once at import.
+# A fresh Response is still built per request because after-request hooks
+# (CORS, compression) mutate response headers.
+_RATE_LIMITED_BODY = orjson.dumps({'error': 'Too many requests. Please try again later.'})
+_AUTH_FAILED_BODY = orjson.dumps({'error': 'Authentication failed. Please check your Stripe keys.'})
+_NETWORK_ERROR_BODY = orjson.dumps({'error': 'Network error. Please try again.'})
+
+def _static_error(body, status):
+    return Response(body, status=status, mimetype='application/json')
+
 @payment_bp.route('/create-subscription', methods=['POST'])
-def create_subscription():
+async def create_subscription():
     """Create a new Stripe subscription"""
     try:
         data = request.get_json()
@@ -26,69 +197,100 @@ def create_subscription():
         
         if not payment_method_id:
             return jsonify({'error': 'Payment method is required'}), 400
-        
-        if plan_name not in STRIPE_PRICE_IDS:
+
+        # One dict probe does both the validation and the lookup
+        price_id = STRIPE_PRICE_IDS.get(plan_name)
+        if price_id is None:
             return jsonify({'error': 'Invalid plan selected'}), 400
         
-        # Create customer
-        customer = stripe.Customer.create(
-            payment_method=payment_method_id,
-            email=data.get('email', 'customer@example.com'),  # You should get this from user data
-            invoice_settings={
-                'default_payment_method': payment_method_id,
-            },
-        )
-        
-        # Create subscription
-        subscription = stripe.Subscription.create(
-            customer=customer.id,
+        email = data.get('email', 'customer@example.com')  # You should get this from user data
+
+        # Repeat checkouts reuse the customer we already created for this
+        # email instead of minting a duplicate
+        customer_id = await _run_stripe(_customer_id_for_email, email)
+        if customer_id is not None:
+            await _run_stripe(
+                stripe.PaymentMethod.attach,
+                payment_method_id,
+                customer=customer_id,
+            )
+            await _run_stripe(
+                stripe.Customer.modify,
+                customer_id,
+                invoice_settings={
+                    'default_payment_method': payment_method_id,
+                },
+            )
+        else:
+            customer = await _run_stripe(
+                stripe.Customer.create,
+                payment_method=payment_method_id,
+                email=email,
+                invoice_settings={
+                    'default_payment_method': payment_method_id,
+                },
+            )
+            customer_id = customer.id
+            # Seed the mapping so the next checkout for this email finds the
+            # customer we just created
+            _customer_id_cache.set(email, customer_id, ttl=CUSTOMER_ID_TTL_SECONDS)
+
+        # Create subscription; the expanded payment_intent is only needed on
+        # the incomplete branch, so don't pay for it on the common active case
+        subscription = await _run_stripe(
+            stripe.Subscription.create,
+            customer=customer_id,
             items=[{
-                'price': STRIPE_PRICE_IDS[plan_name],
+                'price': price_id,
             }],
-            expand=['latest_invoice.payment_intent'],
         )
         
         # Handle subscription status
         if subscription.status == 'active':
             # Subscription is active, update user in database
             # In a real app, you'd update the user's subscription status in your database
-            return jsonify({
-                'subscription_id': subscription.id,
-                'customer_id': customer.id,
-                'status': 'active',
-                'plan': plan_name,
-                'message': 'Subscription created successfully!'
-            })
+            return _struct_response(SubscriptionCreated(
+                subscription_id=subscription.id,
+                customer_id=customer_id,
+                status='active',
+                message='Subscription created successfully!',
+                plan=plan_name
+            ))
         elif subscription.status == 'incomplete':
-            # Payment requires additional action
-            payment_intent = subscription.latest_invoice.payment_intent
-            return jsonify({
-                'subscription_id': subscription.id,
-                'customer_id': customer.id,
-                'status': 'incomplete',
-                'client_secret': payment_intent.client_secret,
-                'message': 'Payment requires additional authentication'
-            })
+            # Payment requires additional action; fetch the client secret now
+            invoice = await _run_stripe(
+                stripe.Invoice.retrieve,
+                subscription.latest_invoice,
+                expand=['payment_intent'],
+            )
+            payment_intent = invoice.payment_intent
+            return _struct_response(SubscriptionCreated(
+                subscription_id=subscription.id,
+                customer_id=customer_id,
+                status='incomplete',
+                message='Payment requires additional authentication',
+                client_secret=payment_intent.client_secret
+            ))
         else:
             return jsonify({'error': 'Subscription creation failed'}), 400
             
     except stripe.error.CardError as e:
-        return jsonify({'error': f'Card error: {e.user_message}'}), 400
-    except stripe.error.RateLimitError as e:
-        return jsonify({'error': 'Too many requests. Please try again later.'}), 429
+        return jsonify({'error': 'Card error: %s' % e.user_message}), 400
+    except stripe.error.RateLimitError:
+        return _static_error(_RATE_LIMITED_BODY, 429)
     except stripe.error.InvalidRequestError as e:
-        return jsonify({'error': f'Invalid request: {str(e)}'}), 400
-    except stripe.error.AuthenticationError as e:
-        return jsonify({'error': 'Authentication failed. Please check your Stripe keys.'}), 401
-    except stripe.error.APIConnectionError as e:
-        return jsonify({'error': 'Network error. Please try again.'}), 502
+        return jsonify({'error': 'Invalid request: %s' % e}), 400
+    except stripe.error.AuthenticationError:
+        return _static_error(_AUTH_FAILED_BODY, 401)
+    except stripe.error.APIConnectionError:
+        return _static_error(_NETWORK_ERROR_BODY, 502)
     except stripe.error.StripeError as e:
-        return jsonify({'error': f'Stripe error: {str(e)}'}), 500
+        return jsonify({'error': 'Stripe error: %s' % e}), 500
     except Exception as e:
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
+        return jsonify({'error': 'An unexpected error occurred: %s' % e}), 500
 
 @payment_bp.route('/cancel-subscription', methods=['POST'])
-def cancel_subscription():
+async def cancel_subscription():
     """Cancel a Stripe subscription"""
     try:
         data = request.get_json()
@@ -98,129 +300,286 @@ def cancel_subscription():
             return jsonify({'error': 'Subscription ID is required'}), 400
         
         # Cancel the subscription
-        subscription = stripe.Subscription.modify(
+        subscription = await _run_stripe(
+            stripe.Subscription.modify,
             subscription_id,
             cancel_at_period_end=True
         )
         
-        return jsonify({
-            'subscription_id': subscription.id,
-            'status': subscription.status,
-            'cancel_at_period_end': subscription.cancel_at_period_end,
-            'current_period_end': subscription.current_period_end,
-            'message': 'Subscription will be cancelled at the end of the current period'
-        })
+        llm_cache.delete_cached_result(_subscription_cache_key(subscription_id))
+
+        return _struct_response(SubscriptionCancelled(
+            subscription_id=subscription.id,
+            status=subscription.status,
+            cancel_at_period_end=subscription.cancel_at_period_end,
+            current_period_end=subscription.current_period_end,
+            message='Subscription will be cancelled at the end of the current period'
+        ))
         
     except stripe.error.InvalidRequestError as e:
-        return jsonify({'error': f'Invalid request: {str(e)}'}), 400
+        return jsonify({'error': 'Invalid request: %s' % e}), 400
     except Exception as e:
-        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+        return jsonify({'error': 'An error occurred: %s' % e}), 500
+
+def _get_cached_subscription(subscription_id):
+    """Return the SubscriptionStatus for a subscription, cached for a few minutes"""
+    cached = llm_cache.get_cached_result(_subscription_cache_key(subscription_id))
+    if cached is not None:
+        return SubscriptionStatus(**cached)
+
+    # Only the miss path talks to Stripe, so only it goes through the
+    # token bucket; cache hits must not spend Stripe budget
+    subscription = _call_with_throttle(stripe.Subscription.retrieve, subscription_id)
+    status = SubscriptionStatus(
+        subscription_id=subscription.id,
+        status=subscription.status,
+        current_period_start=subscription.current_period_start,
+        current_period_end=subscription.current_period_end,
+        cancel_at_period_end=subscription.cancel_at_period_end,
+        plan=subscription.items.data[0].price.nickname if subscription.items.data else None
+    )
+    # Stored as builtins so the Redis path can JSON-serialize it; reads
+    # rebuild the Struct above
+    llm_cache.set_cached_result(
+        _subscription_cache_key(subscription_id),
+        msgspec.to_builtins(status),
+        ttl=SUBSCRIPTION_TTL_SECONDS
+    )
+    return status
+
+# Frontends poll status hard right after checkout; coalesce concurrent
+# lookups for the same subscription onto one Stripe call. These are
+# concurrent.futures primitives rather than asyncio ones because every
+# Flask async view runs on its own event loop — a threading.Lock-guarded
+# dict is what they can all see.
+_inflight_lock = threading.Lock()
+_inflight_status = {}
+
+def _subscription_status_future(subscription_id):
+    """Return the in-flight future for this subscription, starting one if needed"""
+    with _inflight_lock:
+        future = _inflight_status.get(subscription_id)
+        if future is None:
+            future = _stripe_executor.submit(
+                _get_cached_subscription, subscription_id
+            )
+            _inflight_status[subscription_id] = future
+            future.add_done_callback(
+                lambda _: _inflight_status.pop(subscription_id, None)
+            )
+        return future
 
 @payment_bp.route('/subscription-status/<subscription_id>', methods=['GET'])
-def get_subscription_status(subscription_id):
+async def get_subscription_status(subscription_id):
     """Get subscription status"""
     try:
-        subscription = stripe.Subscription.retrieve(subscription_id)
-        
-        return jsonify({
-            'subscription_id': subscription.id,
-            'status': subscription.status,
-            'current_period_start': subscription.current_period_start,
-            'current_period_end': subscription.current_period_end,
-            'cancel_at_period_end': subscription.cancel_at_period_end,
-            'plan': subscription.items.data[0].price.nickname if subscription.items.data else None
-        })
+        future = _subscription_status_future(subscription_id)
+        return _struct_response(await asyncio.wrap_future(future))
         
     except stripe.error.InvalidRequestError as e:
-        return jsonify({'error': f'Subscription not found: {str(e)}'}), 404
+        return jsonify({'error': 'Subscription not found: %s' % e}), 404
     except Exception as e:
-        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+        return jsonify({'error': 'An error occurred: %s' % e}), 500
+
+# Webhook signatures within this window are accepted, mirroring the
+# tolerance stripe.Webhook.construct_event applies
+WEBHOOK_TOLERANCE_SECONDS = 300
+
+# The OpenSSL-backed _hashlib module dispatches SHA-256 to hardware
+# instructions (SHA-NI / ARMv8 crypto); the pure-C _sha256 fallback is an
+# order of magnitude slower over multi-KB webhook bodies
+if hashlib.sha256().__class__.__module__ != '_hashlib':
+    logger.warning('hashlib.sha256 is not OpenSSL-backed; webhook verification will be slow')
+
+def _verify_signature(payload, sig_header, secret):
+    """HMAC-verify a Stripe webhook without parsing its JSON body.
+
+    Replicates WebhookSignature.verify_header: HMAC-SHA256 over
+    '{timestamp}.{payload}', compared in constant time against every v1
+    entry in the Stripe-Signature header.
+    """
+    if not sig_header:
+        return False
+
+    timestamp = None
+    signatures = []
+    for item in sig_header.split(','):
+        key, _, value = item.strip().partition('=')
+        if key == 't':
+            timestamp = value
+        elif key == 'v1':
+            signatures.append(value)
+
+    if timestamp is None or not signatures:
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > WEBHOOK_TOLERANCE_SECONDS:
+            return False
+    except ValueError:
+        return False
+
+    signed_payload = timestamp.encode('utf-8') + b'.' + payload
+    # hmac.digest is the one-shot C path straight into OpenSSL's HMAC
+    expected = hmac.digest(secret.encode('utf-8'), signed_payload, 'sha256')
+    for signature in signatures:
+        try:
+            if hmac.compare_digest(expected, bytes.fromhex(signature)):
+                return True
+        except ValueError:
+            continue
+    return False
+
+# Raw event payloads are parsed and dispatched on a background thread, so
+# the webhook hot path does nothing but HMAC and an enqueue; Stripe only
+# needs the 2xx acknowledgement. The single worker thread also serializes
+# dispatch, so near-simultaneous created/updated deliveries for the same
+# subscription cannot race each other without any per-object locking.
+_event_queue = queue.Queue()
+
+# Stripe delivers at-least-once, retries land on arbitrary gunicorn
+# workers, and near-simultaneous created/updated pairs are common; record
+# processed event ids through the shared cache backend (SET NX on Redis)
+# for the length of Stripe's retry window so a repeat delivery is skipped
+# no matter which worker it reaches
+EVENT_DEDUP_TTL_SECONDS = 86400
+
+def _process_webhook_events():
+    """Drain queued webhook payloads and dispatch them"""
+    while True:
+        payload = _event_queue.get()
+        try:
+            event = orjson.loads(payload)
+            event_id = event.get('id')
+            if event_id is not None and not llm_cache.set_if_absent(
+                    'stripe:event:' + event_id, ttl=EVENT_DEDUP_TTL_SECONDS):
+                logger.info('Skipping duplicate webhook event %s', event_id)
+                continue
+            _handle_event(event)
+        except Exception as e:
+            logger.exception('Webhook processing failed: %s', e)
+        finally:
+            _event_queue.task_done()
+
+threading.Thread(target=_process_webhook_events, daemon=True,
+                 name='stripe-webhook-worker').start()
 
 @payment_bp.route('/webhook', methods=['POST'])
 def stripe_webhook():
     """Handle Stripe webhooks"""
-    payload = request.get_data(as_text=True)
+    # Keep the body as bytes the whole way: HMAC and orjson both take bytes,
+    # so decoding to str (and re-encoding for the signature) was pure waste
+    payload = request.get_data(cache=False)
     sig_header = request.headers.get('Stripe-Signature')
-    endpoint_secret = os.getenv('STRIPE_WEBHOOK_SECRET', 'whsec_YOUR_WEBHOOK_SECRET')
-    
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, endpoint_secret
-        )
-    except ValueError as e:
-        return jsonify({'error': 'Invalid payload'}), 400
-    except stripe.error.SignatureVerificationError as e:
+
+    if not _verify_signature(payload, sig_header, _WEBHOOK_SECRET):
         return jsonify({'error': 'Invalid signature'}), 400
-    
-    # Handle the event
-    if event['type'] == 'invoice.payment_succeeded':
-        # Payment succeeded, update user subscription status
-        invoice = event['data']['object']
-        customer_id = invoice['customer']
-        subscription_id = invoice['subscription']
-        
-        # Update user subscription in your database
-        print(f"Payment succeeded for customer {customer_id}, subscription {subscription_id}")
-        
-    elif event['type'] == 'invoice.payment_failed':
-        # Payment failed, handle accordingly
-        invoice = event['data']['object']
-        customer_id = invoice['customer']
-        
-        print(f"Payment failed for customer {customer_id}")
-        
-    elif event['type'] == 'customer.subscription.deleted':
-        # Subscription cancelled, update user status
-        subscription = event['data']['object']
-        customer_id = subscription['customer']
-        
-        print(f"Subscription cancelled for customer {customer_id}")
-    
-    return jsonify({'status': 'success'})
+
+    _event_queue.put(payload)
+    # Stripe only checks the status code; an empty 200 skips response
+    # serialization entirely
+    return '', 200
+
+def _on_payment_succeeded(invoice):
+    # Payment succeeded, update user subscription status
+    customer_id = invoice['customer']
+    subscription_id = invoice['subscription']
+
+    # Frontends poll hardest right after checkout, exactly when the cached
+    # 'incomplete' flips to 'active'; drop the entry so the next poll sees it
+    if subscription_id:
+        llm_cache.delete_cached_result(_subscription_cache_key(subscription_id))
+
+    # Update user subscription in your database
+    logger.info('Payment succeeded for customer %s, subscription %s', customer_id, subscription_id)
+
+def _on_payment_failed(invoice):
+    # Payment failed, handle accordingly
+    customer_id = invoice['customer']
+
+    subscription_id = invoice.get('subscription')
+    if subscription_id:
+        llm_cache.delete_cached_result(_subscription_cache_key(subscription_id))
+
+    logger.info('Payment failed for customer %s', customer_id)
+
+def _on_subscription_deleted(subscription):
+    # Subscription cancelled, update user status
+    customer_id = subscription['customer']
+
+    # Force the next status read to hit Stripe
+    llm_cache.delete_cached_result(_subscription_cache_key(subscription['id']))
+
+    logger.info('Subscription cancelled for customer %s', customer_id)
+
+# Event type -> handler; each handler receives event['data']['object'].
+# Registering a new event type is one entry here instead of another elif.
+_HANDLERS = {
+    'invoice.payment_succeeded': _on_payment_succeeded,
+    'invoice.payment_failed': _on_payment_failed,
+    'customer.subscription.deleted': _on_subscription_deleted,
+}
+
+def _handle_event(event):
+    """Process a verified, parsed webhook event"""
+    handler = _HANDLERS.get(event['type'])
+    if handler is not None:
+        handler(event['data']['object'])
+
+# The plan catalogue never changes at runtime, so serialize it once at
+# import and answer repeat clients with 304s instead of re-encoding it
+# on every request
+# Frozen (tuple / MappingProxyType) so no code path can mutate or need to
+# defensively copy the shared catalogue
+_PLANS = tuple(MappingProxyType(plan) for plan in (
+    {
+        'id': 'free',
+        'name': 'Free',
+        'price': 0,
+        'pages': 200,
+        'duration': '7 days',
+        'features': ('Basic mistake detection', 'Grammar & spelling check', 'Limited language support'),
+        'stripe_price_id': None
+    },
+    {
+        'id': 'basic',
+        'name': 'Basic',
+        'price': 10,
+        'pages': 1500,
+        'duration': 'per month',
+        'features': ('Advanced mistake detection', 'Multiple languages', 'Grammar & spelling check', 'Email support'),
+        'stripe_price_id': STRIPE_PRICE_IDS['basic']
+    },
+    {
+        'id': 'standard',
+        'name': 'Standard',
+        'price': 22,
+        'pages': 5000,
+        'mcq_analysis': 200,
+        'duration': 'per month',
+        'features': ('All Basic features', '200 MCQ analysis', 'Priority processing', 'Detailed reports', 'Phone support'),
+        'stripe_price_id': STRIPE_PRICE_IDS['standard']
+    },
+    {
+        'id': 'premium',
+        'name': 'Premium',
+        'price': 30,
+        'pages': 10000,
+        'mcq_analysis': 500,
+        'duration': 'per month',
+        'features': ('All Standard features', '500 MCQ analysis', 'Answer key comparison', 'Bulk processing', 'API access', '24/7 support'),
+        'stripe_price_id': STRIPE_PRICE_IDS['premium']
+    }
+))
+_PLANS_JSON = orjson.dumps({'plans': [dict(plan) for plan in _PLANS]})
+_PLANS_ETAG = hashlib.md5(_PLANS_JSON).hexdigest()
 
 @payment_bp.route('/plans', methods=['GET'])
 def get_plans():
     """Get available subscription plans"""
-    plans = [
-        {
-            'id': 'free',
-            'name': 'Free',
-            'price': 0,
-            'pages': 200,
-            'duration': '7 days',
-            'features': ['Basic mistake detection', 'Grammar & spelling check', 'Limited language support'],
-            'stripe_price_id': None
-        },
-        {
-            'id': 'basic',
-            'name': 'Basic',
-            'price': 10,
-            'pages': 1500,
-            'duration': 'per month',
-            'features': ['Advanced mistake detection', 'Multiple languages', 'Grammar & spelling check', 'Email support'],
-            'stripe_price_id': STRIPE_PRICE_IDS['basic']
-        },
-        {
-            'id': 'standard',
-            'name': 'Standard',
-            'price': 22,
-            'pages': 5000,
-            'mcq_analysis': 200,
-            'duration': 'per month',
-            'features': ['All Basic features', '200 MCQ analysis', 'Priority processing', 'Detailed reports', 'Phone support'],
-            'stripe_price_id': STRIPE_PRICE_IDS['standard']
-        },
-        {
-            'id': 'premium',
-            'name': 'Premium',
-            'price': 30,
-            'pages': 10000,
-            'mcq_analysis': 500,
-            'duration': 'per month',
-            'features': ['All Standard features', '500 MCQ analysis', 'Answer key comparison', 'Bulk processing', 'API access', '24/7 support'],
-            'stripe_price_id': STRIPE_PRICE_IDS['premium']
-        }
-    ]
-    
-    return jsonify({'plans': plans})
+    if request.if_none_match.contains(_PLANS_ETAG):
+        return Response(status=304)
+
+    response = Response(_PLANS_JSON, mimetype='application/json')
+    response.set_etag(_PLANS_ETAG)
+    return response
 
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+import openai
+
+# Conservative defaults for gpt-3.5-turbo; override per deployment
+MAX_REQUESTS_PER_MINUTE = int(os.getenv('OPENAI_MAX_REQUESTS_PER_MINUTE', '3500'))
+MAX_TOKENS_PER_MINUTE = int(os.getenv('OPENAI_MAX_TOKENS_PER_MINUTE', '90000'))
+MAX_RETRIES = 5
+
+
+class TokenBucket:
+    """Leaky-bucket rate limiter whose capacity refills over a minute.
+
+    State lives behind a plain threading.Lock held only long enough to
+    compute the wait, so the same bucket throttles every request thread in
+    the process; the sleep itself happens outside the lock.
+    """
+
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.available = float(capacity_per_minute)
+        self.refill_rate = self.capacity / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, amount):
+        """Debit amount and return how long to wait before proceeding"""
+        with self._lock:
+            now = time.monotonic()
+            self.available = min(
+                self.capacity,
+                self.available + (now - self.updated_at) * self.refill_rate
+            )
+            self.updated_at = now
+            self.available -= amount
+            if self.available >= 0:
+                return 0.0
+            return -self.available / self.refill_rate
+
+    def acquire(self, amount=1):
+        wait = self._reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+
+request_bucket = TokenBucket(MAX_REQUESTS_PER_MINUTE)
+token_bucket = TokenBucket(MAX_TOKENS_PER_MINUTE)
+
+
+def estimate_tokens(text):
+    """Rough token estimate: ~4 chars per token plus prompt/response overhead"""
+    return len(text) // 4 + 500
+
+
+def throttled(request_factory, estimated_tokens):
+    """Debit both buckets, then call OpenAI with backoff on rate limits.
+
+    request_factory is a zero-argument callable issuing the API call, so
+    each retry issues a fresh request. Honors the Retry-After header when
+    the API sends one.
+    """
+    request_bucket.acquire(1)
+    token_bucket.acquire(estimated_tokens)
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            return request_factory()
+        except openai.RateLimitError as e:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            retry_after = 0
+            response = getattr(e, 'response', None)
+            if response is not None:
+                try:
+                    retry_after = int(response.headers.get('retry-after', 0))
+                except (TypeError, ValueError):
+                    retry_after = 0
+            time.sleep(max(2 ** attempt, retry_after))